@@ -44,6 +44,7 @@ import json
 import logging
 import gzip
 import gc
+import hashlib
 
 import boto3
 import numpy as np
@@ -52,22 +53,24 @@ import awswrangler as wr
 import streamlit as st
 import plotly.express as pex
 import plotly.graph_objects as go
+import pyarrow as pa
+import pyarrow.csv as pacsv
 import cloudpickle
 import gzip
 
 from collections import OrderedDict, deque, namedtuple
 from concurrent import futures
 from urllib.parse import urlparse
-from toolz.itertoolz import partition_all
+from botocore.config import Config
 from botocore.exceptions import ClientError
 from sspipe import p, px
 from streamlit import session_state as state
 from textwrap import dedent
 from stqdm import stqdm
-from afa import (load_data, resample, run_pipeline, run_cv_select,
-    calc_smape, calc_wape,
-    make_demand_classification, process_forecasts, make_perf_summary,
-    make_health_summary, GROUP_COLS, EXP_COLS)
+from afa import (load_data, resample, run_pipeline, run_cv_select_batch,
+    calc_smape, calc_wape, make_demand_classification, process_forecasts,
+    make_perf_summary, make_health_summary, group_codes, pack_groups,
+    batch_groups, pack_batch, GROUP_COLS, EXP_COLS)
 
 from lambdamap import LambdaExecutor, LambdaFunction
 from awswrangler.exceptions import NoFilesFound
@@ -75,7 +78,6 @@ from streamlit import caching
 from streamlit.uploaded_file_manager import UploadedFile
 from streamlit.script_runner import RerunException
 from st_aggrid import AgGrid, GridOptionsBuilder, JsCode
-from joblib import Parallel, delayed
 from humanfriendly import format_timespan
 
 
@@ -105,6 +107,10 @@ FREQ_MAP_PD = {
 
 METRIC = "smape"
 MAX_LAMBDAS = 1000
+LAMBDA_READ_TIMEOUT = 900 # max. lambda function timeout (secs.)
+BATCH_ROWS = 50000
+BATCH_SERIES = 20 # keeps the lambda responses well below the 6 MB limit
+VIZ_CACHE_ENTRIES = 32 # max. no. of cached plots (shared by all sessions)
 
 
 def validate(df):
@@ -150,36 +156,14 @@ def _sum(y):
     return np.nansum(y)
 
 
-def _resample(df2, freq):
-    df2 = df2.groupby(["channel", "family", "item_id"]) \
-             .resample(freq) \
-             .demand \
-             .sum(min_count=1)
-    return df2
-
-
-def process_data(df, freq, chunksize=None):
+def process_data(df, freq):
     """
     """
 
     df["timestamp"] = pd.DatetimeIndex(df["timestamp"])
     df.set_index("timestamp", inplace=True)
 
-    groups = df.groupby(["channel", "family", "item_id"], sort=False)
-
-    if chunksize is None:
-        chunksize = min(groups.ngroups, 1000)
-
-    total = int(np.ceil(groups.ngroups / chunksize))
-
-    all_results = []
-
-    for chunk in stqdm(partition_all(chunksize, groups), total=total, desc="Progress"):
-        results = Parallel(n_jobs=-1)(delayed(_resample)(dd, freq) for _, dd in chunk)
-        all_results.extend(results)
-
-    df = pd.concat(all_results) \
-           .reset_index(["channel", "family", "item_id"])
+    df = resample(df, freq)
     df.index.name = None
 
     return df
@@ -189,6 +173,19 @@ class StreamlitExecutor(LambdaExecutor):
     """Custom LambdaExecutor to display a progress bar in the app.
     """
 
+    def __init__(self, max_workers, lambda_arn):
+        super().__init__(max_workers, lambda_arn)
+
+        # size the connection pool to the no. of workers so that concurrent
+        # invocations don't queue for connections, wait for long-running
+        # (batched) invocations instead of timing out and re-invoking them,
+        # and back off adaptively if the invocations are throttled
+        config = Config(max_pool_connections=max_workers,
+                        read_timeout=LAMBDA_READ_TIMEOUT,
+                        retries={"max_attempts": 10, "mode": "adaptive"})
+
+        self._client = boto3.client("lambda", config=config)
+
     def map(self, func, payloads, local_mode=False):
         """
         """
@@ -204,34 +201,75 @@ class StreamlitExecutor(LambdaExecutor):
         return wait_for
 
 
+@st.cache(allow_output_mutation=True)
+def get_lambdamap_executor(max_workers, function_name, alias="live"):
+    """Get the executor used to invoke the lambdamap function, this is created
+    once and re-used across launches, keeping its worker threads and client
+    connections alive rather than leaving those of each launch behind. The
+    function `alias` is also only resolved once, when the executor is created.
+
+    """
+
+    lambda_arn = resolve_lambdamap_function(function_name, alias)
+
+    return StreamlitExecutor(max_workers=max_workers, lambda_arn=lambda_arn)
+
+
 def display_progress(wait_for, desc=None):
     """
     """
 
-    # display progress of the futures
+    # display progress of the futures, waking up as soon as any of the
+    # pending futures completes instead of polling all of them
     pbar = stqdm(desc=desc, total=len(wait_for))
-    prev_n_done = 0
-    n_done = sum(f.done() for f in wait_for)
+    pending = set(wait_for)
 
-    while n_done != len(wait_for):
-        diff = n_done - prev_n_done
-        pbar.update(diff)
-        prev_n_done = n_done
-        n_done = sum(f.done() for f in wait_for)
-        time.sleep(0.25)
-
-    diff = n_done - prev_n_done
-    pbar.update(diff)
+    while pending:
+        done, pending = \
+            futures.wait(pending, return_when=futures.FIRST_COMPLETED)
+        pbar.update(len(done))
 
     return
 
 
+def resolve_lambdamap_function(function_name, alias="live"):
+    """Get the lambdamap function to invoke. Its `alias` (which has the
+    provisioned concurrency, see `cdk/cdk/bootstrap.py`) is used iff it
+    exists and points to the same code as the latest version of the function,
+    e.g. it is not used whilst it is still being created or after the function
+    was redeployed without moving the alias.
+
+    """
+
+    client = boto3.client("lambda")
+
+    try:
+        code_alias = client.get_function_configuration(
+            FunctionName=function_name, Qualifier=alias)["CodeSha256"]
+        code_latest = client.get_function_configuration(
+            FunctionName=function_name)["CodeSha256"]
+    except ClientError as e:
+        if e.response["Error"]["Code"] == "ResourceNotFoundException":
+            logging.warning(f"{function_name}:{alias} not found, invoking "
+                            f"{function_name} without provisioned concurrency")
+        else:
+            logging.warning(f"unable to resolve {function_name}:{alias}, "
+                            f"invoking {function_name} ({e})")
+        return function_name
+
+    if code_alias != code_latest:
+        logging.warning(f"{function_name}:{alias} does not point to the latest "
+                        f"code of {function_name}, invoking {function_name} "
+                        f"without provisioned concurrency (see README.md)")
+        return function_name
+
+    return f"{function_name}:{alias}"
+
+
 def run_lambdamap(df, horiz, freq):
     """
     """
 
-    payloads = []
-
     freq = FREQ_MAP_PD[freq]
 
     if freq[0] == "W":
@@ -253,42 +291,48 @@ def run_lambdamap(df, horiz, freq):
     df2 = get_df_resampled(df, freq)
     print(f"completed in {format_timespan(time.time()-start)}")
 
-    groups = df2.groupby(GROUP_COLS, as_index=False, sort=False)
+    # each timeseries is packed into a compact tuple of arrays, which is
+    # much cheaper to serialize than a dataframe
+    packed = pack_groups(df2)
 
-    # generate payload
-    for _, dd in groups:
-        payloads.append(
-            {"args": (dd, horiz, freq),
-             "kwargs": {"metric": "smape",
-                        "cv_periods": cv_periods, "cv_stride": cv_stride}})
+    # batch the timeseries to amortize the per-invocation overhead, using
+    # batches small enough to keep all MAX_LAMBDAS workers busy, the no. of
+    # timeseries per batch is also capped as the results of each timeseries
+    # are returned in the (max. 6 MB) synchronous lambda response
+    batch_rows = min(BATCH_ROWS, max(1, int(np.ceil(len(df2) / MAX_LAMBDAS))))
+    batches = batch_groups(packed, batch_rows, BATCH_SERIES)
 
-    # launch jobs in chunks of 1000
-    executor = StreamlitExecutor(max_workers=min(MAX_LAMBDAS, len(payloads)),
-                                 lambda_arn=LAMBDAMAP_FUNC)
-    wait_for = executor.map(run_cv_select, payloads)
-    display_progress(wait_for, "🔥 Generating forecasts")
+    # generate payload, each batch is sent as a compressed parquet blob (or
+    # as-is when that is smaller) and all the payloads share the same kwargs
+    kwargs = {"metric": "smape", "cv_periods": cv_periods,
+              "cv_stride": cv_stride}
+    payloads = [{"args": (pack_batch(batch), horiz, freq), "kwargs": kwargs}
+                for batch in batches]
+
+    # launch jobs, running at most MAX_LAMBDAS concurrently
+    executor = get_lambdamap_executor(MAX_LAMBDAS, LAMBDAMAP_FUNC)
+    wait_for = executor.map(run_cv_select_batch, payloads)
 
     return wait_for
 
 
 def get_df_resampled(df, freq):
-    groups = df.groupby(["channel", "family", "item_id"], sort=False)
-    chunksize = min(1000, groups.ngroups)
-    total = int(np.ceil(float(groups.ngroups) / chunksize))
+    """Get the dataset resampled to the `freq` frequency, the resampled
+    dataset is kept in the report so that it is only recomputed when the
+    dataset or the frequency changes.
+
+    """
 
-    all_results = []
+    df2 = state["report"]["data"].get("df2", None)
 
-    for chunk in stqdm(partition_all(chunksize, groups), total=total,
-        desc="Batch Preparation Progress"):
-        results = Parallel(n_jobs=-1)(delayed(_resample)(dd, freq) for _, dd in chunk)
-        all_results.extend(results)
+    if df2 is not None and state["report"]["data"].get("df2_freq", None) == freq:
+        return df2
 
-    df2 = pd.concat(all_results) \
-            .reset_index(["channel", "family", "item_id"])
-    df2 = _resample(df, freq).reset_index(["channel", "family", "item_id"])
+    df2 = resample(df, freq)
     df2.index.name = None
 
     state["report"]["data"]["df2"] = df2
+    state["report"]["data"]["df2_freq"] = freq
 
     return df2
 
@@ -405,6 +449,40 @@ def make_df_backtests(df_results, parallel=False):
     return df_backtests.reset_index(["channel", "family", "item_id"])
 
 
+def _pack_report(report):
+    """Return a copy of the report in which the input dataframes are stored
+    as zstd-compressed parquet blobs, which are much smaller and faster to
+    (de)serialize than pickled dataframes.
+    """
+
+    report = report.copy()
+    report["data"] = report["data"].copy()
+
+    for key in ("df", "df2"):
+        df = report["data"].get(key, None)
+
+        if isinstance(df, pd.DataFrame):
+            buf = io.BytesIO()
+            df.to_parquet(buf, engine="pyarrow", compression="zstd")
+            report["data"][key] = buf.getvalue()
+
+    return report
+
+
+def _unpack_report(report):
+    """Inverse of `_pack_report`, reports saved with pickled dataframes are
+    returned as-is.
+    """
+
+    for key in ("df", "df2"):
+        blob = report["data"].get(key, None)
+
+        if isinstance(blob, bytes):
+            report["data"][key] = pd.read_parquet(io.BytesIO(blob))
+
+    return report
+
+
 def save_report(report_fn):
     """
     """
@@ -425,7 +503,8 @@ def save_report(report_fn):
         local_path = f'/tmp/{report_fn}'
 
         # save the report locally
-        cloudpickle.dump(state["report"], gzip.open(local_path, "wb"))
+        cloudpickle.dump(_pack_report(state["report"]),
+                         gzip.open(local_path, "wb"))
 
         # upload the report to s3
         s3_path = \
@@ -467,19 +546,65 @@ def make_df_reports(bucket, prefix):
 # Panels
 #
 def make_mask(df, channel, family, item_id):
-    mask = np.ones(len(df)).astype(bool)
-
     # only mask when all three keys are non-empty
     if channel == "" or family == "" or item_id == "":
-        return ~mask
+        return np.zeros(len(df), dtype=bool)
 
-    mask &= df["channel"].str.upper() == channel.upper()
-    mask &= df["family"].str.upper() == family.upper()
-    mask &= df["item_id"].str.upper() == item_id.upper()
+    mask = np.ones(len(df), dtype=bool)
+
+    for col, val in zip(GROUP_COLS, (channel, family, item_id)):
+        mask &= _key_mask(df[col], val)
 
     return mask
 
 
+def _key_mask(xs, val):
+    """Case-insensitive equality mask of a key column, categorical columns are
+    compared using their integer codes rather than their string values.
+
+    """
+
+    if pd.api.types.is_categorical_dtype(xs):
+        codes = np.flatnonzero(xs.cat.categories.str.upper() == val.upper())
+        return np.isin(xs.cat.codes.values, codes)
+
+    return (xs.str.upper() == val.upper()).values
+
+
+def compact_preds(df):
+    """Convert the channel, family, item_id, and type columns of a forecasts
+    dataframe to categoricals, which are much faster to filter than strings,
+    and downcast the demand to float32 to halve its memory footprint iff this
+    is lossless.
+
+    """
+
+    dtypes = {col: "category" for col in GROUP_COLS + ["type"]}
+
+    demand = df["demand"].values
+    demand32 = demand.astype(np.float32)
+
+    if np.array_equal(demand32, demand, equal_nan=True):
+        dtypes["demand"] = np.float32
+
+    return df.astype(dtypes)
+
+
+def make_filter_vals(df_results):
+    """Make the sorted channel, family, and item_id values used by the
+    visualization filters, these are computed once per forecast rather than
+    on every rerun.
+
+    """
+
+    # the levels of the multi-index are the sorted unique values of each
+    # column, these are found in a single factorization of the columns
+    mi = pd.MultiIndex.from_frame(df_results[GROUP_COLS])
+
+    return {col: [""] + mi.levels[i].tolist()
+            for i, col in enumerate(GROUP_COLS)}
+
+
 @st.cache
 def make_downloads(df_pred, df_results):
     """
@@ -490,8 +615,17 @@ def make_downloads(df_pred, df_results):
     results_fn = os.path.join(ST_DOWNLOADS_PATH,
             f"{state.uploaded_file.name}_results.csv.gz")
 
-    state.df_pred.to_csv(pred_fn, index=False, compression="gzip")
-    state.df_results.to_csv(results_fn, index=False, compression="gzip")
+    # write both files concurrently
+    with futures.ThreadPoolExecutor(max_workers=2) as executor:
+        wait_for = [
+            executor.submit(df_pred.to_csv, pred_fn, index=False,
+                            compression="gzip"),
+            executor.submit(df_results.to_csv, results_fn, index=False,
+                            compression="gzip")
+        ]
+
+        for f in wait_for:
+            f.result()
 
     return pred_fn, results_fn
 
@@ -514,16 +648,21 @@ def panel_create_report(expanded=True):
     """
 
     def _load_data(path):
-        if path.endswith(".csv"):
-            compression = None
-        elif path.endswith(".csv.gz"):
-            compression = "gzip"
-        else:
+        if not path.endswith((".csv", ".csv.gz")):
             raise NotImplementedError
 
-        df = pd.read_csv(path,
-            dtype={"timestamp": str, "channel": str, "family": str,
-                   "item_id": str}, compression=compression)
+        # pyarrow parses the file using multiple threads and infers the
+        # compression from the file extension
+        convert_options = pacsv.ConvertOptions(
+            column_types={"timestamp": pa.string(), "channel": pa.string(),
+                          "family": pa.string(), "item_id": pa.string()},
+            strings_can_be_null=True)
+
+        tbl = pacsv.read_csv(path,
+            read_options=pacsv.ReadOptions(use_threads=True),
+            convert_options=convert_options)
+
+        df = tbl.to_pandas(split_blocks=True, self_destruct=True)
 
         return df
 
@@ -618,6 +757,11 @@ def panel_create_report(expanded=True):
                         # clear any existing data health check results, this forces
                         # a rechecking of data health
                         state.report["data"]["df_health"] = None
+                        state.report["data"]["health_stats"] = None
+
+                        # clear the resampled dataset and hash of any previous file
+                        state.report["data"]["df2"] = None
+                        state.report["data"]["df_hash"] = None
 
                         st.text(f"(completed in {format_timespan(time.time() - start)})")
                 else:
@@ -674,7 +818,8 @@ def panel_load_report(expanded=True):
             start = time.time()
 
             with st.spinner(":hourglass_flowing_sand: Loading Report ..."):
-                state["report"] = cloudpickle.load(gzip.open(fn, "rb"))
+                state["report"] = \
+                    _unpack_report(cloudpickle.load(gzip.open(fn, "rb")))
 
             st.text(f"(completed in {format_timespan(time.time() - start)})")
             state["prev_state"] = "report_loaded"
@@ -712,35 +857,27 @@ def panel_data_health():
                 state.report["data"]["df_health"] = df_health
 
                 # calc. ranked series by demand
-                state.report["data"]["df_ranks"] = \
-                    df.groupby(["channel", "family", "item_id"]) \
-                      .agg({"demand": sum}) \
-                      .sort_values(by="demand", ascending=False)
-
-        num_series = df_health.shape[0]
-        num_channels = df_health["channel"].nunique()
-        num_families = df_health["family"].nunique()
-        num_item_ids = df_health["item_id"].nunique()
-        first_date = df_health['timestamp_min'].dt.strftime('%Y-%m-%d').min()
-        last_date = df_health['timestamp_max'].dt.strftime('%Y-%m-%d').max()
-
-        if freq == 'D':
-            duration_unit = 'D'
-            duration_str = 'days'
-        elif freq in ("W", "W-MON",):
-            duration_unit = 'W'
-            duration_str = 'weeks'
-        elif freq in ("M", "MS",):
-            duration_unit = 'M'
-            duration_str = 'months'
-        else:
-            raise NotImplementedError
+                state.report["data"]["df_ranks"] = make_df_ranks(df_health)
+
+                # calc. the summary stats of the health check
+                state.report["data"]["health_stats"] = \
+                    make_health_stats(df_health, freq)
 
-        duration = pd.Timestamp(last_date).to_period(duration_unit) - \
-                   pd.Timestamp(first_date).to_period(duration_unit)
+            # reports saved before the summary stats were stored
+            if state.report["data"].get("health_stats", None) is None:
+                state.report["data"]["health_stats"] = \
+                    make_health_stats(df_health, freq)
 
-        pc_missing = \
-            df_health["demand_missing_dates"].sum() / df_health["demand_len"].sum()
+        health_stats = state.report["data"]["health_stats"]
+
+        num_series = health_stats["num_series"]
+        num_channels = health_stats["num_channels"]
+        num_families = health_stats["num_families"]
+        num_item_ids = health_stats["num_item_ids"]
+        first_date = health_stats["first_date"]
+        last_date = health_stats["last_date"]
+        duration = health_stats["duration"]
+        duration_str = health_stats["duration_str"]
 
         with st.beta_container():
             _cols = st.beta_columns(3)
@@ -757,7 +894,7 @@ def panel_data_health():
             with _cols[1]:
                 st.markdown("#### Timespan")
                 st.text(f"Frequency:\t{FREQ_MAP_LONG[freq]}\n"
-                        f"Duration:\t{duration.n} {duration_str}\n"
+                        f"Duration:\t{duration} {duration_str}\n"
                         f"First date:\t{first_date}\n"
                         f"Last date:\t{last_date}\n")
                         #f"% missing:\t{int(np.round(pc_missing*100,0))}")
@@ -779,6 +916,99 @@ def panel_data_health():
     return
 
 
+def make_health_stats(df_health, freq):
+    """Calculate the summary stats of the data health check once, rather than
+    on every re-run of the app.
+
+    """
+
+    first_date = df_health['timestamp_min'].min().strftime('%Y-%m-%d')
+    last_date = df_health['timestamp_max'].max().strftime('%Y-%m-%d')
+
+    if freq == 'D':
+        duration_unit = 'D'
+        duration_str = 'days'
+    elif freq in ("W", "W-MON",):
+        duration_unit = 'W'
+        duration_str = 'weeks'
+    elif freq in ("M", "MS",):
+        duration_unit = 'M'
+        duration_str = 'months'
+    else:
+        raise NotImplementedError
+
+    duration = pd.Timestamp(last_date).to_period(duration_unit) - \
+               pd.Timestamp(first_date).to_period(duration_unit)
+
+    health_stats = {
+        "num_series": df_health.shape[0],
+        "num_channels": df_health["channel"].nunique(),
+        "num_families": df_health["family"].nunique(),
+        "num_item_ids": df_health["item_id"].nunique(),
+        "first_date": first_date,
+        "last_date": last_date,
+        "duration": duration.n,
+        "duration_str": duration_str,
+        "pc_missing": df_health["demand_missing_dates"].sum() /
+                      df_health["demand_len"].sum()
+    }
+
+    return health_stats
+
+
+def make_df_ranks(df_health, n=10):
+    """Rank the top `n` timeseries by their total demand, in descending order,
+    using the demand totals already computed by the data health check.
+
+    """
+
+    df_ranks = df_health.set_index(GROUP_COLS)[["demand_sum"]] \
+                        .rename({"demand_sum": "demand"}, axis=1) \
+                        .nlargest(n, "demand")
+
+    return df_ranks
+
+
+def get_df_ranks():
+    """Get the ranked timeseries of the report, these are computed once during
+    the data health check and re-used by the visualization panels.
+
+    """
+
+    df_ranks = state.report["data"].get("df_ranks", None)
+
+    if df_ranks is None:
+        df_health = state.report["data"]["df_health"]
+
+        # reports saved before the health check included the demand totals
+        if "demand_sum" not in df_health:
+            df_health = make_health_summary(state.report["data"]["df"],
+                                            state.report["data"]["freq"])
+            state.report["data"]["df_health"] = df_health
+
+        df_ranks = make_df_ranks(df_health)
+        state.report["data"]["df_ranks"] = df_ranks
+
+    return df_ranks
+
+
+def get_df_hash():
+    """Get the hash of the report dataset, used to identify the forecasts
+    generated from it, this is computed once per dataset.
+
+    """
+
+    df_hash = state.report["data"].get("df_hash", None)
+
+    if df_hash is None:
+        df = state.report["data"]["df"]
+        df_hash = hashlib.blake2b(pd.util.hash_pandas_object(df).values) \
+                         .hexdigest()
+        state.report["data"]["df_hash"] = df_hash
+
+    return df_hash
+
+
 def panel_launch():
     """
     """
@@ -838,37 +1068,56 @@ def panel_launch():
             freq_in = state.report["data"]["freq"]
             freq_out = state.report["afa"]["freq"]
 
-            if backend == "local":
-                wait_for = \
-                    run_pipeline(df, freq_in, freq_out, metric=METRIC,
-                        cv_stride=2, backend="futures", horiz=horiz)
-                display_progress(wait_for, "🔥 Generating forecasts")
-                raw_results = [f.result() for f in futures.as_completed(wait_for)]
-            elif backend == "lambdamap":
-                with st.spinner(f":rocket: Launching forecasts via AWS Lambda (λ)..."):
-                    all_raw_results = []
-                    groups = df.groupby(["channel", "family", "item_id"], sort=False)
-
-                    chunksize = min(5000, groups.ngroups)
-
-                    # divide the dataset into chunks
-                    df["grp"] = groups.ngroup() % int(np.ceil(groups.ngroups / chunksize))
-                    groups = df.groupby("grp", sort=False)
-                    total = df["grp"].nunique()
-
-                    for _, dd in stqdm(groups, total=total, desc="Overall Progress"):
-                        wait_for = run_lambdamap(dd, horiz, freq_out)
-                        raw_results = [f.result() for f in futures.as_completed(wait_for)]
-                        all_raw_results.extend(raw_results)
-
-                    raw_results = all_raw_results
-            else:
-                raise NotImplementedError
+            # forecasts previously generated from the same dataset and
+            # settings are re-used rather than re-launched
+            launch_key = (get_df_hash(), horiz, freq_in, freq_out, backend)
+
+            if state.report["afa"].get("launch_key", None) == launch_key and \
+               state.report["afa"].get("df_results", None) is not None:
+                btn_launch = False
+                st.info("Forecasts were already generated using these settings.")
+
+        if btn_launch:
+            # the futures of launches that are still in flight, e.g. when the
+            # app was re-run by a double-click, are kept outside of the report
+            # (they can't be saved) so that the same forecasts are waited on
+            # instead of being launched again
+            if "afa_launches" not in state:
+                state["afa_launches"] = {}
+
+            wait_for = state["afa_launches"].get(launch_key, None)
+
+            # failed launches are re-launched
+            if wait_for is not None and \
+               any(f.cancelled() or (f.done() and f.exception() is not None)
+                   for f in wait_for):
+                wait_for = None
+
+            if wait_for is None:
+                if backend == "local":
+                    wait_for = \
+                        run_pipeline(df, freq_in, freq_out, metric=METRIC,
+                            cv_stride=2, backend="loky", horiz=horiz)
+                elif backend == "lambdamap":
+                    with st.spinner(f":rocket: Launching forecasts via AWS Lambda (λ)..."):
+                        # all the timeseries are submitted to a single
+                        # executor, which caps the no. of concurrent
+                        # invocations at MAX_LAMBDAS whilst keeping every
+                        # worker busy, rather than waiting for the slowest
+                        # invocation of each chunk
+                        wait_for = run_lambdamap(df, horiz, freq_out)
+                else:
+                    raise NotImplementedError
+
+                state["afa_launches"][launch_key] = wait_for
+
+            display_progress(wait_for, "🔥 Generating forecasts")
 
             with st.spinner("⏳ Calculating results ..."):
                 # generate the results and predictions as dataframes
                 df_results, df_preds, df_model_dist, best_err, naive_err = \
                     process_forecasts(wait_for, METRIC)
+                df_preds = compact_preds(df_preds)
 
                 # generate the demand classifcation info
                 df_demand_cln = make_demand_classification(df, freq_in)
@@ -876,12 +1125,18 @@ def panel_launch():
             # save results and forecast data
             state.report["afa"]["df_results"] = df_results
             state.report["afa"]["df_preds"] = df_preds
+            state.report["afa"]["filter_vals"] = make_filter_vals(df_results)
+            state.report["afa"]["df_acc"] = make_df_acc(df_results, METRIC)
             state.report["afa"]["df_demand_cln"] = df_demand_cln
+            state.report["afa"]["df_cln"] = make_df_cln(df_demand_cln)
             state.report["afa"]["df_model_dist"] = df_model_dist
             state.report["afa"]["best_err"] = best_err
             state.report["afa"]["naive_err"] = naive_err
+            state.report["afa"]["launch_key"] = launch_key
             state.report["afa"]["job_duration"] = time.time() - start
 
+            state["afa_launches"].pop(launch_key, None)
+
         job_duration = state.report["afa"].get("job_duration", None)
 
         if job_duration:
@@ -905,23 +1160,13 @@ def panel_accuracy():
 
     if df is None or df_results is None or df_model_dist is None:
         return
-    
-    def _calc_metrics(dd, metric="smape"):
-        if metric == "smape":
-            metric_func = calc_smape
-        elif metric == "wape":
-            metric_func = calc_wape
-        else:
-            raise NotImplementedError
-
-        ys = np.hstack(dd["y_cv"].apply(np.hstack))
-        yp = np.hstack(dd["yp_cv"].apply(np.hstack))
 
-        return metric_func(ys, yp)
+    df_acc = state.report["afa"].get("df_acc", None)
 
-    df_acc = df_results.groupby(["channel", "family", "item_id"], as_index=False, sort=True) \
-                       .apply(lambda dd: _calc_metrics(dd, METRIC)) \
-                       .rename({None: METRIC}, axis=1)
+    # reports saved before the accuracies were stored with the results
+    if df_acc is None:
+        df_acc = make_df_acc(df_results, METRIC)
+        state.report["afa"]["df_acc"] = df_acc
 
     with st.beta_expander("🎯 Forecast Summary", expanded=True):
         _write(f"""
@@ -937,18 +1182,13 @@ def panel_accuracy():
         across the dataset.
         """)
 
-        df_cln = pd.DataFrame({"category": ["short", "medium", "continuous"]})
-        df_cln = df_cln.merge(
-            df_demand_cln["category"]
-                .value_counts(normalize=True)
-                .reset_index()
-                .rename({"index": "category", "category": "frac"}, axis=1),
-            on="category", how="left"
-        )
+        df_cln = state.report["afa"].get("df_cln", None)
 
-        df_cln = df_cln.fillna(0.0)
-        df_cln["frac"] *= 100
-        df_cln["frac"] = df_cln["frac"].astype(int)
+        # reports saved before the classification table was stored with the
+        # results
+        if df_cln is None:
+            df_cln = make_df_cln(df_demand_cln)
+            state.report["afa"]["df_cln"] = df_cln
 
         _cols = st.beta_columns(3)
 
@@ -993,6 +1233,90 @@ def panel_accuracy():
     return
 
 
+def make_df_acc(df_results, metric="smape"):
+    """Calculate the backtest error of each timeseries over all of its
+    backtest windows, these are computed once per forecast rather than on
+    every rerun.
+
+    """
+
+    y = [np.ravel(ys) for ys in df_results["y_cv"]]
+    yp = [np.ravel(ys) for ys in df_results["yp_cv"]]
+
+    # sum the errors of each timeseries in single passes over the
+    # concatenated backtests
+    codes = np.repeat(group_codes(df_results), [len(ys) for ys in y])
+    y, yp = np.concatenate(y)[codes >= 0], np.concatenate(yp)[codes >= 0]
+    codes = codes[codes >= 0]
+
+    def _group_sum(xs):
+        return np.bincount(codes, weights=np.nan_to_num(xs))
+
+    if metric == "smape":
+        eps = 1.0 / np.bincount(codes)[codes]
+        err = _group_sum(np.abs(y - yp)) / _group_sum(y + yp + 2 * eps)
+    elif metric == "wape":
+        err = _group_sum(np.abs(y - yp)) / (1 + _group_sum(np.abs(y)))
+    else:
+        raise NotImplementedError
+
+    df_acc = df_results[GROUP_COLS].dropna().drop_duplicates()
+    df_acc[metric] = np.round(err, 4)
+
+    return df_acc.reset_index(drop=True)
+
+
+def make_df_cln(df_demand_cln):
+    """Tabulate the percentage of timeseries in each demand classification
+    category, this is stored with the forecast results so that it is not
+    re-tabulated on each rerun.
+
+    """
+
+    df_cln = pd.DataFrame({"category": ["short", "medium", "continuous"]})
+    df_cln = df_cln.merge(
+        df_demand_cln["category"]
+            .value_counts(normalize=True)
+            .reset_index()
+            .rename({"index": "category", "category": "frac"}, axis=1),
+        on="category", how="left"
+    )
+
+    df_cln = df_cln.fillna(0.0)
+    df_cln["frac"] *= 100
+    df_cln["frac"] = df_cln["frac"].astype(int)
+
+    return df_cln
+
+
+def _top_keys(df_grp_demand, cperc_thresh):
+    """Get the keys of the groups within `cperc_thresh` percent of the total
+    demand, i.e. the groups shown in the top performers table, so that the
+    accuracies are only calculated for these groups. The largest group is
+    always included so that the accuracy frame has the expected columns.
+
+    """
+
+    groupby_cols = [c for c in df_grp_demand if c not in ("demand", "perc")]
+
+    df_grp = df_grp_demand.sort_values(by="demand", ascending=False)
+    is_top = df_grp["perc"].cumsum() <= cperc_thresh
+    is_top.iloc[:1] = True
+
+    return df_grp.loc[is_top, groupby_cols]
+
+
+def _isin_keys(df, df_keys):
+    """Mask the rows of `df` whose keys are in the rows of `df_keys`.
+
+    """
+
+    cols = list(df_keys.columns)
+
+    return pd.MultiIndex.from_frame(df[cols]) \
+             .isin(pd.MultiIndex.from_frame(df_keys))
+
+
 @st.cache()
 def make_df_top(df, df_results, groupby_cols, dt_start, dt_stop, cperc_thresh,
     metric="smape"):
@@ -1033,9 +1357,13 @@ def make_df_top(df, df_results, groupby_cols, dt_start, dt_stop, cperc_thresh,
            .agg({"demand": sum})
     df_grp_demand["perc"] = df_grp_demand["demand"] / total_demand * 100
 
-    # get the best models for each group
+    # only the top groups by demand are displayed
+    df_top_keys = _top_keys(df_grp_demand, cperc_thresh)
+
+    # get the best models for each top group
+    df_results = df_results.query("rank == 1")
     df_grp_metrics = \
-        df_results.query("rank == 1") \
+        df_results[_isin_keys(df_results, df_top_keys)] \
             .groupby(groupby_cols, as_index=False, sort=False) \
             .apply(lambda dd: calc_period_metrics(dd, dt_start, dt_stop)) \
             .pipe(pd.DataFrame) \
@@ -1110,9 +1438,13 @@ def make_ml_df_top(df, df_backtests, groupby_cols, dt_start, dt_stop, cperc_thre
            .agg({"demand": sum})
     df_grp_demand["perc"] = df_grp_demand["demand"] / total_demand * 100
 
-    # get the best models for each group
+    # only the top groups by demand are displayed
+    df_top_keys = _top_keys(df_grp_demand, cperc_thresh)
+
+    # get the best models for each top group
     df_grp_metrics = \
-        df_backtests.groupby(groupby_cols, as_index=False, sort=False) \
+        df_backtests[_isin_keys(df_backtests, df_top_keys)] \
+                    .groupby(groupby_cols, as_index=False, sort=False) \
                     .apply(lambda dd: calc_period_metrics(dd, dt_start, dt_stop)) \
                     .rename({None: metric}, axis=1)
 
@@ -1170,25 +1502,30 @@ def panel_top_performers():
         the most recent six-month period.
         """)
 
-        st.write("#### Filters")
-
-        _cols = st.beta_columns([2,1,1])
-
         dt_min = df.index.min()
         dt_max = df.index.max()
 
-        with _cols[0]:
-            groupby_cols = st.multiselect("Group By",
-                ["channel", "family", "item_id"], ["channel", "family", "item_id"])
+        # the filters are only applied when the form is submitted, rather
+        # than re-running the whole app on every change of a filter
+        with st.form("top_perf_form"):
+            st.write("#### Filters")
 
-        with _cols[1]:
-            dt_start = st.date_input("Start", value=dt_min, min_value=dt_min, max_value=dt_max)
+            _cols = st.beta_columns([2,1,1])
 
-        with _cols[2]:
-            dt_stop = st.date_input("Stop", value=dt_max, min_value=dt_min, max_value=dt_max)
+            with _cols[0]:
+                groupby_cols = st.multiselect("Group By",
+                    ["channel", "family", "item_id"], ["channel", "family", "item_id"])
+
+            with _cols[1]:
+                dt_start = st.date_input("Start", value=dt_min, min_value=dt_min, max_value=dt_max)
+
+            with _cols[2]:
+                dt_stop = st.date_input("Stop", value=dt_max, min_value=dt_min, max_value=dt_max)
+
+            cperc_thresh = st.slider("Percentage of total demand",
+                step=5, value=80, format="%d%%")
 
-        cperc_thresh = st.slider("Percentage of total demand",
-            step=5, value=80, format="%d%%")
+            st.form_submit_button("Apply")
 
         dt_start = dt_start.strftime("%Y-%m-%d")
         dt_stop = dt_stop.strftime("%Y-%m-%d")
@@ -1234,6 +1571,48 @@ def panel_top_performers():
     return
 
 
+@st.cache(allow_output_mutation=True, max_entries=VIZ_CACHE_ENTRIES)
+def make_viz_fig(y_ts, y, yp_ts, yp, bt_ts, bt, horiz, freq):
+    """Make the actual vs. forecast demand chart of a single timeseries, the
+    figure is cached so that it is only rebuilt when the timeseries changes.
+
+    """
+
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(
+        x=y_ts, y=y, mode='lines', name="actual",
+        fill="tozeroy", line={"width": 3}
+    ))
+    fig.add_trace(go.Scatter(
+        x=yp_ts, y=yp, mode='lines', name="forecast",
+        fill="tozeroy", line={"width": 3}
+    ))
+
+    df_backtest = \
+        pd.DataFrame({"yp": bt}, index=pd.DatetimeIndex(bt_ts)) \
+          .sort_index() \
+          .resample(FREQ_MAP_PD[freq]) \
+          .apply(np.nanmean)
+
+    fig.add_trace(go.Scatter(x=df_backtest.index, y=df_backtest.yp, mode="lines",
+        name="backtest (mean)", line_dash="dot", line_color="black"))
+
+    fig.update_layout(
+        margin={"t": 0, "b": 0, "r": 0, "l": 0},
+        height=250,
+        legend={"orientation": "h", "yanchor": "bottom", "y": 1.0, "xanchor":"left", "x": 0.0}
+    )
+    fig.update_xaxes(rangeslider_visible=True)
+
+    initial_range = pd.date_range(end=yp_ts.max(), periods=horiz*8, freq=freq)
+    initial_range = [max(initial_range[0], pd.Timestamp(y_ts.min())),
+                     initial_range[-1]]
+
+    fig["layout"]["xaxis"].update(range=initial_range)
+
+    return fig
+
+
 def panel_visualization():
     """
     """
@@ -1249,17 +1628,22 @@ def panel_visualization():
     horiz = state.report["afa"]["horiz"]
     start = time.time()
 
-    df_top = df.groupby(["channel", "family", "item_id"], as_index=False) \
-               .agg({"demand": sum}) \
-               .sort_values(by="demand", ascending=False)
+    # default to the timeseries with the highest total demand
+    top_channel, top_family, top_item_id = get_df_ranks().index[0]
+
+    filter_vals = state.report["afa"].get("filter_vals", None)
 
-    channel_vals = [""] + sorted(df_results["channel"].unique())
-    family_vals = [""] + sorted(df_results["family"].unique())
-    item_id_vals = [""] + sorted(df_results["item_id"].unique())
+    if filter_vals is None:
+        filter_vals = make_filter_vals(df_results)
+        state.report["afa"]["filter_vals"] = filter_vals
 
-    channel_index = channel_vals.index(df_top["channel"].iloc[0])
-    family_index = family_vals.index(df_top["family"].iloc[0])
-    item_id_index = item_id_vals.index(df_top["item_id"].iloc[0])
+    channel_vals = filter_vals["channel"]
+    family_vals = filter_vals["family"]
+    item_id_vals = filter_vals["item_id"]
+
+    channel_index = channel_vals.index(top_channel)
+    family_index = family_vals.index(top_family)
+    item_id_index = item_id_vals.index(top_item_id)
 
     with st.beta_expander("👁️  Visualization", expanded=True):
         _write(f"""
@@ -1292,67 +1676,20 @@ def panel_visualization():
         if len(df_plot) > 0:
             # display the line chart
 
-            y = df_plot.query("type == 'actual'")["demand"]
-            y_ts = df_plot.query("type == 'actual'")["timestamp"]
+            is_actual = (df_plot["type"] == "actual").values
+            is_fcast = (df_plot["type"] == "fcast").values
 
-            yp = df_plot.query("type == 'fcast'")["demand"]
-            yp_ts = df_plot.query("type == 'fcast'")["timestamp"]
+            y = df_plot["demand"][is_actual]
+            y_ts = df_plot["timestamp"][is_actual]
 
-            fig = go.Figure()
-            fig.add_trace(go.Scatter(
-                x=y_ts, y=y, mode='lines', name="actual",
-                fill="tozeroy", line={"width": 3}
-            ))
-            fig.add_trace(go.Scatter(
-                x=yp_ts, y=yp, mode='lines', name="forecast",
-                fill="tozeroy", line={"width": 3}
-            ))
+            yp = df_plot["demand"][is_fcast]
+            yp_ts = df_plot["timestamp"][is_fcast]
 
             # plot 
             dd = df_results[results_mask].query("rank == 1").iloc[0]
 
-            df_backtest = \
-                pd.DataFrame({"yp": np.hstack(dd['yp_cv'])},
-                             index=pd.DatetimeIndex(np.hstack(dd["ts_cv"]))) \
-                  .sort_index() \
-                  .resample(FREQ_MAP_PD[freq]) \
-                  .apply(np.nanmean)
-
-            fig.add_trace(go.Scatter(x=df_backtest.index, y=df_backtest.yp, mode="lines",
-                name="backtest (mean)", line_dash="dot", line_color="black"))
-                
-    #       fig.update_layout(
-    #           xaxis={
-    #               "showgrid": True,
-    #               "gridcolor": "lightgrey",
-    #           },
-    #           yaxis={
-    #               "showgrid": True,
-    #               "gridcolor": "lightgrey",
-    #           }
-    #       )
-            fig.update_layout(
-                margin={"t": 0, "b": 0, "r": 0, "l": 0},
-                height=250,
-                legend={"orientation": "h", "yanchor": "bottom", "y": 1.0, "xanchor":"left", "x": 0.0}
-            )
-            fig.update_xaxes(
-                rangeslider_visible=True,
-#               rangeselector=dict(
-#                   buttons=list([
-#                       dict(count=1, label="1m", step="month", stepmode="backward"),
-#                       dict(count=6, label="6m", step="month", stepmode="backward"),
-#                       dict(count=1, label="YTD", step="year", stepmode="todate"),
-#                       dict(count=1, label="1y", step="year", stepmode="backward"),
-#                       dict(step="all")
-#                   ])
-#               )
-            )
-
-            initial_range = pd.date_range(end=yp_ts.max(), periods=horiz*8, freq=freq)
-            initial_range = [max(initial_range[0], y_ts.min()), initial_range[-1]]
-
-            fig["layout"]["xaxis"].update(range=initial_range)
+            fig = make_viz_fig(y_ts.values, y.values, yp_ts.values, yp.values,
+                np.hstack(dd["ts_cv"]), np.hstack(dd["yp_cv"]), horiz, freq)
 
             st.plotly_chart(fig, use_container_width=True)
 
@@ -1384,14 +1721,19 @@ def download_afc_files():
     _df_preds = wr.s3.read_csv(preds_s3_prefix,
         dtype={"channel": str, "family": str, "item_id": str})
 
-    _preds = []
-    for _, dd in _df_preds.groupby(["channel", "family", "item_id"], as_index=False, sort=False):
-        dd.sort_values(by="timestamp", ascending=True, inplace=True)
-        if dd.shape[0] > horiz:
-            dd = dd.iloc[1:,:]
-        _preds.append(dd)
+    # sort each timeseries by timestamp, keeping the timeseries in order of
+    # appearance, and drop the first forecast of the timeseries that are
+    # longer than the horizon
+    _df_preds = _df_preds.dropna(subset=["channel", "family", "item_id"])
+    codes = group_codes(_df_preds, ["channel", "family", "item_id"])
+    order = np.lexsort((_df_preds["timestamp"].values, codes))
+    _df_preds = _df_preds.iloc[order]
 
-    df_preds = pd.concat(_preds)
+    codes = codes[order]
+    is_first = np.diff(codes, prepend=-1) != 0
+    sizes = np.bincount(codes)[codes]
+
+    df_preds = _df_preds[~(is_first & (sizes > horiz))].copy()
     df_preds["type"] = "fcast"
     df_preds["timestamp"] = pd.DatetimeIndex(df_preds["timestamp"])
 
@@ -1401,15 +1743,16 @@ def download_afc_files():
     if df_actual is None:
         df_actual = get_df_resampled(df, freq)
 
-    df_preds = df_preds.append(
+    df_preds = pd.concat([df_preds,
                 df_actual
                 .reset_index()
                 .rename({"index": "timestamp"}, axis=1)
-                .assign(type='actual'))
+                .assign(type='actual')])
 
     df_preds["channel"] = df_preds["channel"].str.upper()
     df_preds["family"] = df_preds["family"].str.upper()
     df_preds["item_id"] = df_preds["item_id"].str.upper()
+    df_preds = compact_preds(df_preds)
 
     freq = FREQ_MAP_PD[state.report["afc"]["freq"]]
 
@@ -1473,63 +1816,62 @@ def panel_downloads():
             s3_afa_export_path = state["report"]["afa"]["s3_afa_export_path"]
 
             with st.spinner(":hourglass_flowing_sand: Exporting Forecasts ..."):
-                # export the forecast file to s3 if it doesnt exist
-                if afa_forecasts_s3_path is None:
-                    now_str = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
-                    basename = os.path.basename(state["report"]["data"]["path"])
-                    afa_forecasts_s3_path = \
-                        f'{s3_afa_export_path}/{basename}_{now_str}_afa-forecasts.csv.gz'
-
-                    wr.s3.to_csv(df_preds, afa_forecasts_s3_path,
-                                 compression="gzip", index=False)
-
-                    state["report"]["afa"]["forecasts_s3_path"] = \
-                        afa_forecasts_s3_path
-                else:
-                    pass
+                now_str = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
+                basename = os.path.basename(state["report"]["data"]["path"])
 
-                forecasts_signed_url = create_presigned_url(afa_forecasts_s3_path)
+                # export the forecast and backtest files to s3 concurrently
+                # if they dont exist
+                with futures.ThreadPoolExecutor(max_workers=2) as executor:
+                    wait_for = []
 
-            st.markdown("#### Statistical Forecasts")
-            st.markdown("####")
+                    if afa_forecasts_s3_path is None:
+                        afa_forecasts_s3_path = \
+                            f'{s3_afa_export_path}/{basename}_{now_str}_afa-forecasts.csv.gz'
 
-            st.info(textwrap.dedent(f"""
-            Download the forecasts file [here]({forecasts_signed_url})  
-            `(completed in {format_timespan(time.time()-start)})`.  
-            """))
+                        wait_for.append(
+                            executor.submit(wr.s3.to_csv, df_preds,
+                                afa_forecasts_s3_path, compression="gzip",
+                                index=False))
 
-            with st.spinner(":hourglass_flowing_sand: Exporting Backtests ..."):
-                # export the forecast file to s3 if it doesnt exist
-                if afa_backtests_s3_path is None:
-                    now_str = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
-                    basename = os.path.basename(state["report"]["data"]["path"])
-                    afa_backtests_s3_path = \
-                        f'{s3_afa_export_path}/{basename}_{now_str}_afa-backtests.csv.gz'
+                    if afa_backtests_s3_path is None:
+                        afa_backtests_s3_path = \
+                            f'{s3_afa_export_path}/{basename}_{now_str}_afa-backtests.csv.gz'
 
-                    keep_cols = \
-                        ["channel", "family", "item_id", "model_type",
-                         "smape_mean"]
+                        df_backtests = df_results[GROUP_COLS + ["y_cv", "yp_cv"]].copy()
 
-                    df_backtests = df_results[GROUP_COLS + ["y_cv", "yp_cv"]].copy()
+                        # convert df_results to csv-friendly backtests
+                        df_backtests["y_cv"] = df_backtests["y_cv"].apply(lambda xs: xs.tolist())
+                        df_backtests["yp_cv"] = df_backtests["yp_cv"].apply(lambda xs: xs.tolist())
 
-                    # convert df_results to csv-friendly backtests
-                    df_backtests["y_cv"] = df_backtests["y_cv"].apply(lambda xs: xs.tolist())
-                    df_backtests["yp_cv"] = df_backtests["yp_cv"].apply(lambda xs: xs.tolist())
+                        df_backtests.rename(
+                            {"y_cv": "bt_actuals", "yp_cv": "bt_forecast"}, axis=1,
+                            inplace=True)
 
-                    df_backtests.rename(
-                        {"y_cv": "bt_actuals", "yp_cv": "bt_forecast"}, axis=1,
-                        inplace=True)
+                        wait_for.append(
+                            executor.submit(wr.s3.to_csv, df_backtests,
+                                afa_backtests_s3_path, compression="gzip",
+                                index=False))
 
-                    wr.s3.to_csv(df_backtests, afa_backtests_s3_path,
-                                 compression="gzip", index=False)
+                    # re-raise any exceptions from the writes
+                    for f in wait_for:
+                        f.result()
 
-                    state["report"]["afa"]["backtests_s3_path"] = \
-                        afa_backtests_s3_path
-                else:
-                    pass
+                state["report"]["afa"]["forecasts_s3_path"] = \
+                    afa_forecasts_s3_path
+                state["report"]["afa"]["backtests_s3_path"] = \
+                    afa_backtests_s3_path
 
+                forecasts_signed_url = create_presigned_url(afa_forecasts_s3_path)
                 backtests_signed_url = create_presigned_url(afa_backtests_s3_path)
 
+            st.markdown("#### Statistical Forecasts")
+            st.markdown("####")
+
+            st.info(textwrap.dedent(f"""
+            Download the forecasts file [here]({forecasts_signed_url})  
+            `(completed in {format_timespan(time.time()-start)})`.  
+            """))
+
             st.info(textwrap.dedent(f"""
             Download the forecast backtests file [here]({backtests_signed_url})  
             `(completed in {format_timespan(time.time()-start)})`.
@@ -1563,57 +1905,60 @@ def panel_downloads():
                     f'{s3_export_path}/{prefix}/accuracy-metrics-values/Accuracy_{prefix}_*.csv'
                 start = time.time()
 
-                if afc_forecasts_s3_path is None:
-                    try:
+                now_str = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
+                basename = os.path.basename(state["report"]["data"]["path"])
+
+                # export the forecast and backtest files to s3 concurrently
+                # if they dont exist
+                with futures.ThreadPoolExecutor(max_workers=2) as executor:
+                    fcast_future, bt_future = None, None
+
+                    if afc_forecasts_s3_path is None:
                         df_preds = state["report"]["afc"]["df_preds"]
                         df_preds["demand"] = np.ceil(df_preds["demand"].clip(0).fillna(0.0))
-                        now_str = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
-                        basename = os.path.basename(state["report"]["data"]["path"])
 
                         afc_forecasts_path = \
                             f"{s3_afc_export_path}/{basename}_{now_str}_afc-forecasts.csv.gz"
 
-                        wr.s3.to_csv(
+                        fcast_future = executor.submit(wr.s3.to_csv,
                             df_preds[["timestamp","channel", "family", "item_id", "demand", "type"]],
                             afc_forecasts_path, compression="gzip", index=False)
-                        state["report"]["afc"]["forecasts_s3_path"] = afc_forecasts_path
-                        afc_forecasts_s3_path = afc_forecasts_path
-                    except NoFilesFound:
-                        pass
-                else:
-                    pass
-
-                forecasts_signed_url = create_presigned_url(afc_forecasts_s3_path)
-
-                st.info(textwrap.dedent(f"""
-                Download the forecasts file [here]({forecasts_signed_url})  
-                `(completed in {format_timespan(time.time()-start)})`.
-                """))
-
-                start = time.time()
 
-                if afc_backtests_s3_path is None:
-                    try:
+                    if afc_backtests_s3_path is None:
                         df_backtests = state["report"]["afc"]["df_backtests"]
 
-                        now_str = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
-                        basename = os.path.basename(state["report"]["data"]["path"])
-
-                        afc_backtests_s3_path = \
+                        afc_backtests_path = \
                             f"{s3_afc_export_path}/{basename}_{now_str}_afc-backtests.csv.gz"
 
-                        wr.s3.to_csv(
+                        bt_future = executor.submit(wr.s3.to_csv,
                             df_backtests.rename({"demand": "bt_forecasts", "target_value": "bt_actuals"}, axis=1)
                                         .drop(["p10", "p90"], axis=1),
-                            afc_backtests_s3_path, compression="gzip", index=False)
-                        state["report"]["afc"]["backtests_s3_path"] = afc_backtests_s3_path
-                    except NoFilesFound:
-                        pass
-                else:
-                    pass
+                            afc_backtests_path, compression="gzip", index=False)
+
+                    if fcast_future is not None:
+                        try:
+                            fcast_future.result()
+                            state["report"]["afc"]["forecasts_s3_path"] = afc_forecasts_path
+                            afc_forecasts_s3_path = afc_forecasts_path
+                        except NoFilesFound:
+                            pass
+
+                    if bt_future is not None:
+                        try:
+                            bt_future.result()
+                            state["report"]["afc"]["backtests_s3_path"] = afc_backtests_path
+                            afc_backtests_s3_path = afc_backtests_path
+                        except NoFilesFound:
+                            pass
 
+                forecasts_signed_url = create_presigned_url(afc_forecasts_s3_path)
                 backtests_signed_url = create_presigned_url(afc_backtests_s3_path)
 
+                st.info(textwrap.dedent(f"""
+                Download the forecasts file [here]({forecasts_signed_url})  
+                `(completed in {format_timespan(time.time()-start)})`.
+                """))
+
                 st.info(textwrap.dedent(f"""
                 Download the forecast backtests file [here]({backtests_signed_url})  
                 `(completed in {format_timespan(time.time()-start)})`.  
@@ -1760,6 +2105,8 @@ def panel_ml_launch():
                     state["report"]["afc"]["df_preds"] = df_preds
                     state["report"]["afc"]["df_results"] = df_results
                     state["report"]["afc"]["df_backtests"] = df_backtests
+                    state["report"]["afc"]["filter_vals"] = \
+                        make_filter_vals(df_results)
 
             _cols = st.beta_columns([2,0.485])
 
@@ -1861,30 +2208,35 @@ def panel_ml_top_performers():
         specific groups of items during a given backtest period.
         """)
 
-        st.write("#### Filters")
-
         # dt_min and dt_max are the time boundaries of the backtesting
         # for amazon forecast, this is relatively short
         dt_min = df_backtests["timestamp"].min()
         dt_max = df_backtests["timestamp"].max()
 
-        _cols = st.beta_columns([2,1,1])
+        # the filters are only applied when the form is submitted, rather
+        # than re-running the whole app on every change of a filter
+        with st.form("ml_top_perf_form"):
+            st.write("#### Filters")
 
-        with _cols[0]:
-            groupby_cols = st.multiselect("Group By",
-                ["channel", "family", "item_id"], ["channel", "family", "item_id"],
-                key="ml_top_perf_groupby")
+            _cols = st.beta_columns([2,1,1])
 
-        with _cols[1]:
-            dt_start = st.date_input("Start", value=dt_min, min_value=dt_min,
-                    max_value=dt_max, key="ml_dt_start")
+            with _cols[0]:
+                groupby_cols = st.multiselect("Group By",
+                    ["channel", "family", "item_id"], ["channel", "family", "item_id"],
+                    key="ml_top_perf_groupby")
 
-        with _cols[2]:
-            dt_stop = st.date_input("Stop", value=dt_max, min_value=dt_min,
-                    max_value=dt_max, key="ml_dt_stop")
+            with _cols[1]:
+                dt_start = st.date_input("Start", value=dt_min, min_value=dt_min,
+                        max_value=dt_max, key="ml_dt_start")
+
+            with _cols[2]:
+                dt_stop = st.date_input("Stop", value=dt_max, min_value=dt_min,
+                        max_value=dt_max, key="ml_dt_stop")
+
+            cperc_thresh = st.slider("Percentage of total demand",
+                step=5, value=80, format="%d%%", key="ml_perc_demand")
 
-        cperc_thresh = st.slider("Percentage of total demand",
-            step=5, value=80, format="%d%%", key="ml_perc_demand")
+            st.form_submit_button("Apply")
 
         dt_start = dt_start.strftime("%Y-%m-%d")
         dt_stop = dt_stop.strftime("%Y-%m-%d")
@@ -1930,6 +2282,44 @@ def panel_ml_top_performers():
     return
 
 
+@st.cache(allow_output_mutation=True, max_entries=VIZ_CACHE_ENTRIES)
+def make_ml_viz_fig(y_ts, y, yp_ts, yp, bt_ts, bt, horiz, freq):
+    """Make the actual vs. ML forecast demand chart of a single timeseries,
+    the figure is cached so that it is only rebuilt when the timeseries
+    changes.
+
+    """
+
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(
+        x=y_ts, y=y, mode='lines+markers', name="actual",
+        fill="tozeroy", line={"width":3}, marker=dict(size=4)
+    ))
+
+    fig.add_trace(go.Scatter(
+        x=yp_ts, y=np.round(yp, 0), mode='lines+markers', name="forecast",
+        fill="tozeroy", marker=dict(size=4)
+    ))
+
+    fig.add_trace(go.Scatter(x=bt_ts, y=np.round(bt, 0), mode="lines",
+        name="backtest", line_dash="dot", line_color="black"))
+    fig.update_layout(
+        margin={"t": 0, "b": 0, "r": 0, "l": 0},
+        height=250,
+        legend={"orientation": "h", "yanchor": "bottom", "y": 1.0, "xanchor":"left", "x": 0.0}
+    )
+
+    fig.update_xaxes(rangeslider_visible=True)
+
+    initial_range = pd.date_range(end=yp_ts.max(), periods=horiz*8, freq=freq)
+    initial_range = [max(initial_range[0], pd.Timestamp(y_ts.min())),
+                     initial_range[-1]]
+
+    fig["layout"]["xaxis"].update(range=initial_range)
+
+    return fig
+
+
 def panel_ml_visualization():
     """
     """
@@ -1946,17 +2336,22 @@ def panel_ml_visualization():
     horiz = state.report["afc"]["horiz"]
     start = time.time()
 
-    df_top = df.groupby(["channel", "family", "item_id"], as_index=False) \
-               .agg({"demand": sum}) \
-               .sort_values(by="demand", ascending=False)
+    # default to the timeseries with the highest total demand
+    top_channel, top_family, top_item_id = get_df_ranks().index[0]
+
+    filter_vals = state.report["afc"].get("filter_vals", None)
 
-    channel_vals = [""] + sorted(df_ml_results["channel"].unique())
-    family_vals = [""] + sorted(df_ml_results["family"].unique())
-    item_id_vals = [""] + sorted(df_ml_results["item_id"].unique())
+    if filter_vals is None:
+        filter_vals = make_filter_vals(df_ml_results)
+        state.report["afc"]["filter_vals"] = filter_vals
 
-    channel_index = channel_vals.index(df_top["channel"].iloc[0])
-    family_index = family_vals.index(df_top["family"].iloc[0])
-    item_id_index = item_id_vals.index(df_top["item_id"].iloc[0])
+    channel_vals = filter_vals["channel"]
+    family_vals = filter_vals["family"]
+    item_id_vals = filter_vals["item_id"]
+
+    channel_index = channel_vals.index(top_channel)
+    family_index = family_vals.index(top_family)
+    item_id_index = item_id_vals.index(top_item_id)
 
     with st.beta_expander("👁️  Visualization", expanded=True):
         with st.form("ml_viz_form"):
@@ -1991,38 +2386,19 @@ def panel_ml_visualization():
             # display the line chart
             #fig = pex.line(df_plot, x="timestamp", y="demand", color="type")
 
-            y = df_plot.query("type == 'actual'")["demand"]
-            y_ts = df_plot.query("type == 'actual'")["timestamp"]
-
-            yp = df_plot.query("type == 'fcast'")["demand"]
-            yp_ts = df_plot.query("type == 'fcast'")["timestamp"]
-
-            fig = go.Figure()
-            fig.add_trace(go.Scatter(
-                x=y_ts, y=y, mode='lines+markers', name="actual",
-                fill="tozeroy", line={"width":3}, marker=dict(size=4)
-            ))
-
-            fig.add_trace(go.Scatter(
-                x=yp_ts, y=np.round(yp, 0), mode='lines+markers', name="forecast",
-                fill="tozeroy", marker=dict(size=4)
-            ))
+            is_actual = (df_plot["type"] == "actual").values
+            is_fcast = (df_plot["type"] == "fcast").values
 
-            fig.add_trace(go.Scatter(x=_df_backtests["timestamp"],
-                y=np.round(_df_backtests.demand, 0), mode="lines",
-                name="backtest", line_dash="dot", line_color="black"))
-            fig.update_layout(
-                margin={"t": 0, "b": 0, "r": 0, "l": 0},
-                height=250,
-                legend={"orientation": "h", "yanchor": "bottom", "y": 1.0, "xanchor":"left", "x": 0.0}
-            )
+            y = df_plot["demand"][is_actual]
+            y_ts = df_plot["timestamp"][is_actual]
 
-            fig.update_xaxes(rangeslider_visible=True)
+            yp = df_plot["demand"][is_fcast]
+            yp_ts = df_plot["timestamp"][is_fcast]
 
-            initial_range = pd.date_range(end=yp_ts.max(), periods=horiz*8, freq=freq)
-            initial_range = [max(initial_range[0], y_ts.min()), initial_range[-1]]
+            fig = make_ml_viz_fig(y_ts.values, y.values, yp_ts.values,
+                yp.values, _df_backtests["timestamp"].values,
+                _df_backtests["demand"].values, horiz, freq)
 
-            fig["layout"]["xaxis"].update(range=initial_range)
             st.plotly_chart(fig, use_container_width=True)
 
         plot_duration = time.time() - start
@@ -2156,7 +2532,7 @@ if __name__ == "__main__":
 
     parser.add_argument("--lambdamap-function", type=str,
         help="ARN/name of the lambdamap function",
-        default="AfaLambdaMapFunction")
+        default=LAMBDAMAP_FUNC)
 
     parser.add_argument("--landing-page-url", type=str,
         help="URL of the AFA landing page", default="#")
@@ -2164,9 +2540,19 @@ if __name__ == "__main__":
     parser.add_argument("--max-lambdas", type=int,
         help="URL of the AFA landing page", default=MAX_LAMBDAS)
 
+    parser.add_argument("--batch-rows", type=int,
+        help="max. no. of rows per lambda invocation", default=BATCH_ROWS)
+
+    parser.add_argument("--batch-series", type=int,
+        help="max. no. of timeseries per lambda invocation",
+        default=BATCH_SERIES)
+
     args = parser.parse_args()
 
+    LAMBDAMAP_FUNC = args.lambdamap_function
     MAX_LAMBDAS = args.max_lambdas
+    BATCH_ROWS = args.batch_rows
+    BATCH_SERIES = args.batch_series
 
     assert(os.path.exists(os.path.expanduser(args.local_dir)))
 
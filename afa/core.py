@@ -1,3 +1,6 @@
+import os
+import io
+import pickle
 import traceback
 import contextlib
 import statsmodels.api as sm
@@ -8,6 +11,7 @@ import time
 from collections import OrderedDict
 from concurrent import futures
 from functools import partial
+from joblib.externals.loky import get_reusable_executor
 from tqdm.auto import tqdm
 
 from scipy import signal, stats
@@ -102,20 +106,16 @@ def exsmooth(y, horiz, **kwargs):
     if len(y) == 0:
         y = np.zeros(1)
         
-    extra_periods = horiz-1
-
-    f = [y[0]]
-
-    # Create all the m+1 forecast
-    for t in range(1,len(y)-1):
-        f.append((1-alpha)*f[-1]+alpha*y[t])
-
-    # Forecast for all extra months
-    for t in range(extra_periods):
-        # Update the forecast as the last forecast
-        f.append(f[-1])    
+    # Create all the m+1 forecast, i.e. the recursion
+    # f[t] = (1-alpha)*f[t-1] + alpha*y[t] starting from f[0] = y[0], as a
+    # first-order IIR filter
+    f = np.empty(max(len(y)-1, 1))
+    f[0] = y[0]
+    f[1:] = signal.lfilter([alpha], [1, alpha-1], y[1:-1],
+                           zi=[(1-alpha)*y[0]])[0]
 
-    yp = np.array(f[-horiz:]).clip(0)
+    # Forecast for all extra months as the last forecast
+    yp = np.full(horiz, f[-1]).clip(0)
 
 #   if use_log:
 #       yp = np.exp(yp)
@@ -462,14 +462,6 @@ def make_demand_classification(df, freq):
         y = y[np.logical_not(np.isnan(y)) & (y > 0)]
         return len(y)
 
-    def _category(r):
-        if r["retired"]:
-            if r["life_periods"] < r["len"] / 4.0:
-                return "short"
-            return "medium"
-        else:
-            return "continuous"
-
     def _spectral_entropy(y):
         y = y[np.logical_not(np.isnan(y))]
         f, Pxx_den = signal.periodogram(y)
@@ -500,7 +492,11 @@ def make_demand_classification(df, freq):
     df_analysis["intermittent"] = df_analysis["spectral_entropy"] > 5.0
 
     # classify series as short, medium ("med"), or continuous ("cont")
-    df_analysis["category"] = df_analysis.apply(_category, axis=1)
+    is_retired = df_analysis["retired"].astype(bool)
+    is_short = df_analysis["life_periods"] < df_analysis["len"] / 4.0
+
+    df_analysis["category"] = \
+        np.select([~is_retired, is_short], ["continuous", "short"], "medium")
 
     df_analysis = df_analysis.astype({"life_periods": int, "len": int})
 
@@ -584,35 +580,40 @@ def make_health_summary(df, freq):
 
     """
 
-    # no. of missing dates b/w the first and last dates of the timeseries
-    def null_count(xs):
-        return xs.isnull().sum().astype(int)
-
-    def nonnull_count(xs):
-        return (~xs.isnull()).sum().astype(int)
+    df_summary = df.reset_index().rename({"index": "timestamp"}, axis=1)
 
     # no. days of non-zero demand
-    def nonzero_count(xs):
-        return (xs > 0).sum().astype(int)
-
-    def date_count(xs):
-        return xs.index.nunique()
+    df_summary["nonzero"] = df_summary["demand"] > 0
 
-    df_summary = df.reset_index().rename({"index": "timestamp"}, axis=1)
+    # use the builtin (cythonized) groupby aggregations instead of python
+    # functions, which are called once per timeseries
     df_summary = \
         df_summary \
           .groupby(GROUP_COLS) \
-          .agg({"demand": [null_count, nonzero_count, nonnull_count,
-                           np.nanmean, np.nanmedian, len],
-                "timestamp": [min, max]}) \
-          .rename({"null_count": "missing_dates"}, axis=1)
+          .agg(demand_len=("demand", "size"),
+               demand_nonnull_count=("demand", "count"),
+               demand_nonzero_count=("nonzero", "sum"),
+               demand_nanmean=("demand", "mean"),
+               demand_nanmedian=("demand", "median"),
+               demand_sum=("demand", "sum"),
+               timestamp_min=("timestamp", "min"),
+               timestamp_max=("timestamp", "max"))
+
+    # no. of missing dates b/w the first and last dates of the timeseries
+    df_summary["demand_missing_dates"] = \
+        df_summary["demand_len"] - df_summary["demand_nonnull_count"]
 
     df_summary["pc_missing"] = (
-        df_summary[("demand", "missing_dates")] / 
-        ( df_summary[("demand", "missing_dates")] +
-          df_summary[("demand", "nonnull_count")] )
+        df_summary["demand_missing_dates"] / 
+        ( df_summary["demand_missing_dates"] +
+          df_summary["demand_nonnull_count"] )
     )
-    df_summary.columns = df_summary.columns.map("_".join).str.strip("_")
+
+    df_summary = df_summary[
+        ["demand_missing_dates", "demand_nonzero_count",
+         "demand_nonnull_count", "demand_nanmean", "demand_nanmedian",
+         "demand_len", "demand_sum", "timestamp_min", "timestamp_max",
+         "pc_missing"]]
 
     df_summary["pc_missing"] = np.round(df_summary["pc_missing"] * 100, 0)
     df_summary["demand_nanmean"] = np.round(df_summary["demand_nanmean"], 1)
@@ -625,24 +626,24 @@ def process_forecasts(wait_for, metric):
     """
     """
 
-    # aggregate the forecasts
-    raw_results = [f.result() for f in futures.as_completed(wait_for)]
-
     pred_lst = []
     results_lst = []
 
-    for df_pred, df_results in raw_results:
+    # aggregate the forecasts as they complete
+    for f in futures.as_completed(wait_for):
+        df_pred, df_results = f.result()
         pred_lst.append(df_pred)
         results_lst.append(df_results)
 
     # results dataframe
-    df_results = pd.concat(results_lst) \
-                   .reset_index(drop=True)
+    df_results = pd.concat(results_lst, ignore_index=True, copy=False)
+    results_lst.clear()
 
     assert(df_results is not None)
 
     # predictions dataframe
-    df_preds = pd.concat(pred_lst)
+    df_preds = pd.concat(pred_lst, copy=False)
+    pred_lst.clear()
     df_preds.index.name = "timestamp"
     df_preds.reset_index(inplace=True)
 
@@ -885,7 +886,8 @@ def run_cv(cfg, df, horiz, freq, cv_start, cv_stride=1, dc_dict=None,
     # sliding window horizon actuals
     Y = sliding_window_view(y[cv_start:], cv_horiz)[::cv_stride,:]
     
-    Ycv = []
+    # backtest forecasts at each cv_stride, one row per window
+    Ycv = np.empty(Y.shape)
 
     # |  y     |  horiz  |..............|
     # |  y      |  horiz  |.............|
@@ -894,13 +896,9 @@ def run_cv(cfg, df, horiz, freq, cv_start, cv_stride=1, dc_dict=None,
     #   ::
     # |  y                    | horiz   |
 
-    for i in range(cv_start, len(y)-cv_horiz+1, cv_stride):
-        yp = func(y[:i], cv_horiz, freq, dc=dc_dict[i])
-        Ycv.append(yp)
+    for j, i in enumerate(range(cv_start, len(y)-cv_horiz+1, cv_stride)):
+        Ycv[j] = func(y[:i], cv_horiz, freq, dc=dc_dict[i])
 
-    # keep the backtest forecasts at each cv_stride
-    Ycv = np.vstack(Ycv)
-    
     # keep the backtest forecast time indices
     Yts = sliding_window_view(ts[cv_start:], cv_horiz)[::cv_stride,:]
 
@@ -909,20 +907,22 @@ def run_cv(cfg, df, horiz, freq, cv_start, cv_stride=1, dc_dict=None,
     assert not np.any(np.isnan(Ycv))
     assert Ycv.shape == Y.shape
 
-    # calc. error metrics
-    df_results = calc_metrics(Y, Ycv, metric)
-    df_results.insert(0, "model_type", params.split("|")[0])
-    df_results.insert(1, "params", params)
-    
+    # calc. error metrics, the results are returned as a single record so
+    # that the results of all the configurations can be made into one
+    # dataframe by `run_cv_select`
+    results = OrderedDict([("model_type", params.split("|")[0]),
+                           ("params", params)])
+    results.update(calc_metrics_record(Y, Ycv, metric))
+
     # store the final backtest window actuals and predictions
-    df_results["y_cv"] = [Y]
-    df_results["yp_cv"] = [Ycv]
-    df_results["ts_cv"] =  [Yts]
+    results["y_cv"] = Y
+    results["yp_cv"] = Ycv
+    results["ts_cv"] = Yts
 
     # generate the final forecast (1-dim)
-    df_results["yhat"] = [func(y, horiz, freq, dc=dc_dict[len(y)-1])]
+    results["yhat"] = func(y, horiz, freq, dc=dc_dict[len(y)-1])
     
-    return df_results
+    return results
 
 
 def run_cv_select(df, horiz, freq, metric="smape", cv_stride=3,
@@ -983,7 +983,8 @@ def run_cv_select(df, horiz, freq, metric="smape", cv_stride=3,
     results = [run_cv(cfg, df, horiz, freq, cv_start, cv_stride,
                       dc_dict=dc_dict, metric=metric) for cfg in grid]
 
-    df_results = pd.concat(results)
+    # the index of each configuration's results is 0
+    df_results = pd.DataFrame(results, index=np.zeros(len(results), dtype=int))
 
     # rank results by the metric
     df_results.sort_values(by=metric + "_mean", ascending=True, inplace=True)
@@ -1019,8 +1020,47 @@ def run_cv_select(df, horiz, freq, metric="smape", cv_stride=3,
     df["type"] = "actual"
 
     # combine historical and predictions dataframes, re-ordering columns
-    df_pred = df[GROUP_COLS + ["demand", "type"]] \
-                .append(df_pred)[GROUP_COLS + ["demand", "type"]]
+    df_pred = pd.concat([df[GROUP_COLS + ["demand", "type"]], df_pred]) \
+                [GROUP_COLS + ["demand", "type"]]
+
+    return df_pred, df_results
+
+
+def run_cv_select_packed(packed, horiz, freq, group_cols=GROUP_COLS,
+    **kwargs):
+    """Run `run_cv_select` on a timeseries packed by `pack_groups`.
+
+    """
+
+    return run_cv_select(unpack_group(packed, group_cols), horiz, freq,
+                         **kwargs)
+
+
+def run_cv_select_batch(batch, horiz, freq, group_cols=GROUP_COLS, **kwargs):
+    """Run `run_cv_select` on a batch of timeseries from `batch_groups`, or
+    a batch serialized by `pack_batch`, returning the concatenated forecasts
+    and results of the batch.
+
+    Only the best model (rank 1) of each timeseries keeps its backtest
+    windows and forecast (`y_cv`, `yp_cv`, `ts_cv`, and `yhat`), the other
+    models keep just their metrics, which is all that `process_forecasts`
+    uses. This keeps the results of a batch small enough to be returned
+    from a lambda invocation.
+
+    """
+
+    batch = unpack_batch(batch, group_cols)
+
+    results = [run_cv_select_packed(packed, horiz, freq, group_cols, **kwargs)
+               for packed in batch]
+
+    df_pred = pd.concat([r[0] for r in results], copy=False)
+    df_results = pd.concat([r[1] for r in results], copy=False)
+
+    is_best = df_results["rank"] == 1
+
+    for col in ("y_cv", "yp_cv", "ts_cv", "yhat"):
+        df_results[col] = df_results[col].where(is_best, None)
 
     return df_pred, df_results
 
@@ -1044,7 +1084,10 @@ def run_pipeline(data, freq_in, freq_out, metric="smape",
         performed every 2 weeks in the training data. Smaller values will lead
         to longer model selection durations.
     backend : str, optional
-        "multiprocessing", "pyspark", or "lambdamap"
+        "python", "futures", "loky", "pyspark", or "lambdamap". The "loky"
+        backend re-uses the same pool of worker processes across calls, so
+        subsequent runs don't pay the cost of spawning the workers and
+        re-importing the modelling dependencies.
 
     """
     
@@ -1071,13 +1114,25 @@ def run_pipeline(data, freq_in, freq_out, metric="smape",
         results = \
             [run_cv_select(dd, horiz, freq_out, metric, cv_stride)
                  for _, dd in groups]
-    elif backend == "futures":
-        ex = futures.ProcessPoolExecutor()
+    elif backend in ("futures", "loky"):
+        if backend == "futures":
+            ex = futures.ProcessPoolExecutor()
+        else:
+            ex = get_reusable_executor()
+
+        # submit the timeseries in ~100 batches per worker instead of one
+        # task per timeseries, each batch is (de)serialized in a single
+        # round-trip whilst there are still enough batches to keep the
+        # workers balanced and the progress bar moving
+        n_tasks = 100 * (os.cpu_count() or 1)
+        batch_rows = max(1, int(np.ceil(len(df) / n_tasks)))
+        batches = batch_groups(pack_groups(df, group_cols), batch_rows)
 
         wait_for = [
-            ex.submit(run_cv_select,
-                *(dd, horiz, freq_out, metric, cv_stride))
-                for _, dd in groups
+            ex.submit(run_cv_select_batch,
+                *(batch, horiz, freq_out, group_cols),
+                metric=metric, cv_stride=cv_stride)
+                for batch in batches
         ]
 
         # return the list of futures
@@ -1100,12 +1155,22 @@ def calc_metrics(Y, Ycv, metric="smape"):
 
     """
 
+    df_metrics = pd.DataFrame([calc_metrics_record(Y, Ycv, metric)])
+
+    assert(len(df_metrics) == 1)
+
+    return df_metrics
+
+
+def calc_metrics_record(Y, Ycv, metric="smape"):
+    """Same as `calc_metrics` but return the metrics as a single record
+    (`OrderedDict`) instead of a one-row dataframe.
+
+    """
+
     assert Y.ndim == Ycv.ndim == 2
     assert Y.shape == Ycv.shape
 
-    # calc. error metrics
-    df_metrics = pd.DataFrame()
-
     metric_aggs = [
         ("mean", np.nanmean),
         ("median", np.nanmedian),
@@ -1119,15 +1184,13 @@ def calc_metrics(Y, Ycv, metric="smape"):
     else:
         raise NotImplementedError
 
-    df_metrics[metric] = [metric_func(Y, Ycv)]
+    # calc. error metrics
+    metrics = OrderedDict([(metric, metric_func(Y, Ycv))])
 
     for agg, agg_func in metric_aggs:
-        df_metrics[f"{metric}_{agg}"] = \
-            df_metrics[metric].apply(agg_func).round(4)
-
-    assert(len(df_metrics) == 1)
+        metrics[f"{metric}_{agg}"] = np.round(agg_func(metrics[metric]), 4)
 
-    return df_metrics
+    return metrics
     
 
 def calc_smape(y, yp, axis=0, smooth=True):
@@ -1263,12 +1326,80 @@ def impute_dates(df, freq, dt_stop=None):
     if "timestamp" in df:
         df.drop("timestamp", axis=1, inplace=True)
 
+    df_imputed = _impute_dates_grid(df, freq, dt_stop)
+
+    if df_imputed is not None:
+        return df_imputed
+
     df = ts_groups(df).apply(partial(_impute_dates, freq=freq, dt_stop=dt_stop))
     df.index = df.index.droplevel(0)
 
     return df
 
 
+def _impute_dates_grid(df, freq, dt_stop=None):
+    """Fill missing dates in all the timeseries at once by placing each row on
+    a single date grid shared by all the timeseries, instead of re-indexing
+    each timeseries separately. Returns `None` if the rows are not all on the
+    grid, are duplicated, or end after `dt_stop`, these datasets are handled
+    by the per-timeseries method.
+
+    """
+
+    codes = group_codes(df)
+    is_valid = codes >= 0
+
+    if not is_valid.any():
+        return None
+
+    ts = df.index[is_valid]
+    dt_max = ts.max() if dt_stop is None else pd.Timestamp(dt_stop)
+
+    if dt_max < ts.max():
+        return None
+
+    grid = pd.date_range(ts.min(), dt_max, freq=freq)
+    pos = grid.get_indexer(ts)
+
+    if (pos < 0).any():
+        return None
+
+    # sort the rows by timeseries then date
+    rows = np.flatnonzero(is_valid)
+    order = np.lexsort((pos, codes[rows]))
+    rows, pos, codes = rows[order], pos[order], codes[rows[order]]
+
+    is_first = np.diff(codes, prepend=-1) != 0
+
+    if ((np.diff(pos, prepend=-1) == 0) & ~is_first).any():
+        return None
+
+    # first and last grid positions of each timeseries
+    starts = np.flatnonzero(is_first)
+    lo = pos[starts]
+
+    if dt_stop is None:
+        hi = np.append(pos[starts[1:] - 1], pos[-1])
+    else:
+        hi = np.full(len(starts), len(grid) - 1)
+
+    lengths = hi - lo + 1
+    offsets = np.cumsum(lengths) - lengths
+
+    # output row of each input row, all the other output rows are imputed
+    src = np.full(lengths.sum(), -1)
+    src[offsets[codes] + pos - lo[codes]] = rows
+
+    df_imputed = df.reset_index(drop=True).reindex(src)
+
+    for col in GROUP_COLS:
+        df_imputed[col] = np.repeat(df[col].values[rows[starts]], lengths)
+
+    df_imputed.index = grid[np.arange(len(src)) + np.repeat(lo - offsets, lengths)]
+
+    return df_imputed
+
+
 def resample(df, freq):
     """Resample a dataframe to a new frequency. Note that if a period in the
     new frequency contains only nulls, then the resulting resampled sum is NaN.
@@ -1280,11 +1411,16 @@ def resample(df, freq):
 
     """
 
-    df = df.groupby(GROUP_COLS, sort=False) \
-           .resample(freq) \
-           .agg({"demand": _sum}) \
+    # sum the demand of the non-empty periods of all the timeseries in a
+    # single groupby, rather than resampling each timeseries separately
+    df = df.groupby(GROUP_COLS + [pd.Grouper(freq=freq)], sort=False) \
+           ["demand"] \
+           .sum(min_count=1) \
            .reset_index(level=[0,1,2])
 
+    # fill in the empty periods b/w the first and last periods
+    df = impute_dates(df, freq)
+
     return df
 
 
@@ -1324,6 +1460,254 @@ def ts_groups(self, **groupby_kwds):
     return self.groupby(GROUP_COLS, **groupby_kwds)
 
 
+def group_codes(df, group_cols=GROUP_COLS):
+    """Compute an integer group code for each row of a timeseries dataframe.
+    Codes are numbered in order of first appearance, consistent with
+    `df.groupby(group_cols, sort=False)`, rows with a null key are coded -1.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+    group_cols : list, optional
+
+    Returns
+    -------
+    np.array
+
+    Examples
+    --------
+    The codes of the non-null keys are dense, even when a null key comes
+    first:
+
+    >>> df = pd.DataFrame({"channel": [np.nan, "a", "a", "b", "b"],
+    ...                    "family": "f", "item_id": "i"})
+    >>> group_codes(df)
+    array([-1,  0,  0,  1,  1])
+
+    """
+
+    codes = np.zeros(len(df), dtype=np.int64)
+    is_null = np.zeros(len(df), dtype=bool)
+
+    for col in group_cols:
+        col_codes, uniques = pd.factorize(df[col])
+        codes = codes * max(len(uniques), 1) + col_codes
+        is_null |= col_codes < 0
+
+    # number the groups of the rows with non-null keys only, so that the
+    # codes are dense (0..n_groups-1) regardless of where null keys occur
+    codes[~is_null] = pd.factorize(codes[~is_null])[0]
+    codes[is_null] = -1
+
+    return codes
+
+
+def pack_groups(df, group_cols=GROUP_COLS):
+    """Split a timeseries dataframe into one compact `(keys, timestamps,
+    demand)` tuple per group, in the same order as
+    `df.groupby(group_cols, sort=False)`. The tuples are much cheaper to
+    serialize than dataframes when sending the timeseries to remote workers,
+    use `unpack_group` to rebuild them.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+    group_cols : list, optional
+
+    Returns
+    -------
+    list of tuple
+
+    """
+
+    order, starts, stops = _group_bounds(df, group_cols)
+
+    keys = df[group_cols].values[order[starts]]
+    ts = df.index.values[order]
+    demand = df["demand"].values[order]
+
+    return [(tuple(k), ts[i:j], demand[i:j])
+            for k, i, j in zip(keys, starts, stops)]
+
+
+def unpack_group(packed, group_cols=GROUP_COLS):
+    """Rebuild the dataframe of a single timeseries packed by `pack_groups`.
+
+    Parameters
+    ----------
+    packed : tuple
+    group_cols : list, optional
+
+    Returns
+    -------
+    pd.DataFrame
+
+    """
+
+    keys, ts, demand = packed
+
+    data = dict(zip(group_cols, keys))
+    data["demand"] = demand
+
+    return pd.DataFrame(data, index=pd.DatetimeIndex(ts))
+
+
+def batch_groups(packed, batch_rows, max_series=None):
+    """Greedily pack the timeseries from `pack_groups` into batches of at
+    most `batch_rows` rows and `max_series` timeseries, largest timeseries
+    first. A timeseries longer than `batch_rows` is put in a batch of its
+    own.
+
+    Parameters
+    ----------
+    packed : list of tuple
+    batch_rows : int
+    max_series : int, optional
+        Max. no. of timeseries per batch, unlimited if `None`.
+
+    Returns
+    -------
+    list of list of tuple
+
+    """
+
+    sizes = np.array([len(demand) for _, _, demand in packed])
+
+    batches = []
+    batch, n_rows = [], 0
+
+    for i in np.argsort(-sizes, kind="stable"):
+        if batch and (n_rows + sizes[i] > batch_rows or
+                      len(batch) == max_series):
+            batches.append(batch)
+            batch, n_rows = [], 0
+
+        batch.append(packed[i])
+        n_rows += sizes[i]
+
+    if batch:
+        batches.append(batch)
+
+    return batches
+
+
+def pack_batch(batch, group_cols=GROUP_COLS):
+    """Serialize a batch of timeseries from `batch_groups` into a single
+    zstd-compressed parquet blob iff it is smaller than the pickled batch,
+    otherwise the batch is returned as-is. The parquet metadata outweighs the
+    compression of small batches, whereas larger batches are a fraction of
+    their pickled size. The demand is stored as float32 iff this is lossless.
+    Use `unpack_batch` to restore the batch.
+
+    Parameters
+    ----------
+    batch : list of tuple
+    group_cols : list, optional
+
+    Returns
+    -------
+    bytes or list of tuple
+
+    Examples
+    --------
+    A batch of 20 timeseries of three years of weekly demand is sent as a
+    much smaller parquet blob, whereas a single short timeseries is sent
+    as-is:
+
+    >>> import pickle
+    >>> ts = pd.date_range("2019-01-07", periods=156, freq="W-MON").values
+    >>> rng = np.random.default_rng(0)
+    >>> batch = [(("c", "f", f"i{i}"), ts, rng.poisson(5, 156).astype(float))
+    ...          for i in range(20)]
+    >>> blob = pack_batch(batch)
+    >>> len(pickle.dumps(blob)) < len(pickle.dumps(batch)) / 3
+    True
+    >>> small = [(("c", "f", "i0"), ts[:52], batch[0][2][:52])]
+    >>> pack_batch(small) is small
+    True
+
+    """
+
+    lengths = [len(demand) for _, _, demand in batch]
+
+    data = OrderedDict(
+        (col, np.repeat([keys[i] for keys, _, _ in batch], lengths))
+        for i, col in enumerate(group_cols))
+    data["series"] = np.repeat(np.arange(len(batch), dtype=np.int32), lengths)
+    data["timestamp"] = np.concatenate([ts for _, ts, _ in batch])
+
+    demand = np.concatenate([demand for _, _, demand in batch])
+    demand32 = demand.astype(np.float32)
+
+    if np.array_equal(demand32, demand, equal_nan=True):
+        demand = demand32
+
+    data["demand"] = demand
+
+    buf = io.BytesIO()
+    pd.DataFrame(data).to_parquet(buf, engine="pyarrow", compression="zstd",
+                                  index=False)
+    blob = buf.getvalue()
+
+    if len(blob) >= len(pickle.dumps(batch, protocol=pickle.HIGHEST_PROTOCOL)):
+        return batch
+
+    return blob
+
+
+def unpack_batch(blob, group_cols=GROUP_COLS):
+    """Restore a batch of timeseries serialized by `pack_batch`, batches that
+    were not serialized are returned as-is.
+
+    Parameters
+    ----------
+    blob : bytes or list of tuple
+    group_cols : list, optional
+
+    Returns
+    -------
+    list of tuple
+
+    """
+
+    if not isinstance(blob, bytes):
+        return blob
+
+    df = pd.read_parquet(io.BytesIO(blob), engine="pyarrow")
+
+    series = df["series"].values
+    bounds = np.concatenate(
+        [[0], np.flatnonzero(np.diff(series)) + 1, [len(series)]])
+
+    keys = df[group_cols].values
+    ts = df["timestamp"].values
+    demand = df["demand"].values.astype(np.float64)
+
+    return [(tuple(keys[i]), ts[i:j], demand[i:j])
+            for i, j in zip(bounds[:-1], bounds[1:])]
+
+
+def _group_bounds(df, group_cols):
+    """Get the row order that sorts a dataframe by group and the start/stop
+    positions of each group in that order.
+
+    """
+
+    codes = group_codes(df, group_cols)
+
+    # sort once by group code, preserving the row order within each group
+    order = np.argsort(codes, kind="stable")
+    order = order[codes[order] >= 0]
+    codes = codes[order]
+
+    bounds = np.concatenate(
+        [[0], np.flatnonzero(np.diff(codes)) + 1, [len(codes)]])
+    starts, stops = bounds[:-1], bounds[1:]
+    is_nonempty = stops > starts
+
+    return order, starts[is_nonempty], stops[is_nonempty]
+
+
 def _sum(y):
     if np.all(pd.isnull(y)):
         return np.nan
@@ -20,6 +20,21 @@ class BootstrapStack(cdk.Stack):
                 description="(Required) An e-mail address with which to receive "
                 "deployment notifications.")
 
+        lambda_reserved_concurrency = core.CfnParameter(self,
+                "lambdaReservedConcurrency", type="Number", default=0,
+                min_value=0,
+                description="(Optional) No. of concurrent executions to reserve "
+                "for the AfaLambdaMapFunction, 0 leaves it unreserved. At least "
+                "100 executions must remain unreserved in the account.")
+
+        lambda_provisioned_concurrency = core.CfnParameter(self,
+                "lambdaProvisionedConcurrency", type="Number", default=0,
+                min_value=0,
+                description="(Optional) No. of pre-initialized execution "
+                "environments of the AfaLambdaMapFunction, which avoid cold "
+                "starts, 0 disables provisioned concurrency. Note that "
+                "provisioned concurrency is billed whilst it is enabled.")
+
         #   instance_type = core.CfnParameter(self, "instanceType",
         #           default="ml.t2.medium",
         #           description="(Required) SageMaker Notebook instance type on which to host "
@@ -128,11 +143,54 @@ class BootstrapStack(cdk.Stack):
             cd ./lambdamap/lambdamap_cdk/
             pip install -r ./requirements.txt
             cdk bootstrap aws://{self.account}/{self.region} &>/dev/null
-            nohup cdk deploy --require-approval never \
+
+            # the extra_cmds are run when building the function's container
+            # image, install a shallow clone of the package non-editably and
+            # without the pip cache so that the image (pulled on cold starts)
+            # only contains what is needed at runtime
+            #
+            # lambda cpu is allocated in proportion to memory, 1769 MB is the
+            # size at which a function gets one full vCPU, the model fitting
+            # is cpu-bound so this is faster and cheaper per series than the
+            # fractional cpu of smaller sizes
+            #
+            # the concurrency settings are applied once the function exists,
+            # so the deployment and these steps are run together in the
+            # background from a script
+            cat > ./deploy_lambdamap.sh <<'EOS'
+            set -x -v -e
+
+            cdk deploy --require-approval never \
                 --context stack_name=AfaLambdaMapStack \
                 --context function_name=AfaLambdaMapFunction \
-                --context memory_size=256 \
-                --context extra_cmds='git clone https://github.com/aws-samples/simple-forecast-solution.git ; cd ./simple-forecast-solution/ ; git checkout main ; pip install -e .' &
+                --context memory_size=1769 \
+                --context extra_cmds='git clone --depth 1 --branch main https://github.com/aws-samples/simple-forecast-solution.git ; pip install --no-cache-dir ./simple-forecast-solution/ ; rm -rf ./simple-forecast-solution/'
+
+            # reserve concurrent executions for the function iff requested
+            if [ {lambda_reserved_concurrency.value_as_string} -gt 0 ] ; then
+                aws lambda put-function-concurrency --region {self.region} \
+                    --function-name AfaLambdaMapFunction \
+                    --reserved-concurrent-executions {lambda_reserved_concurrency.value_as_string}
+            fi
+
+            # provision pre-initialized execution environments iff requested,
+            # these are configured on the "live" alias of a published version,
+            # the dashboard checks for the alias when launching forecasts and
+            # invokes it iff it runs the latest code of the function
+            if [ {lambda_provisioned_concurrency.value_as_string} -gt 0 ] ; then
+                LAMBDAMAP_VERSION=$(aws lambda publish-version --region {self.region} \
+                    --function-name AfaLambdaMapFunction \
+                    --query Version --output text)
+                aws lambda create-alias --region {self.region} \
+                    --function-name AfaLambdaMapFunction \
+                    --name live --function-version $LAMBDAMAP_VERSION
+                aws lambda put-provisioned-concurrency-config --region {self.region} \
+                    --function-name AfaLambdaMapFunction --qualifier live \
+                    --provisioned-concurrent-executions {lambda_provisioned_concurrency.value_as_string}
+            fi
+            EOS
+
+            nohup bash ./deploy_lambdamap.sh &
 
             git clone https://github.com/aws-samples/simple-forecast-solution.git
             cd ./simple-forecast-solution
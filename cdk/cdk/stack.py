@@ -438,24 +438,24 @@ class AfaStack(cdk.Stack):
         # use local miniconda distro
         source "$CONDA_DIR/bin/activate"
 
-        # install custom conda environment(s)
-        conda create -y -q -n py39 python=3.9 nodejs=14
+        # install custom conda environment(s), the stacks are deployed from
+        # the bootstrap instance so nodejs and the aws-cdk cli tool are not
+        # needed on the notebook instance
+        conda create -y -q -n py39 python=3.9
         conda activate py39
 
-        # install the aws-cdk cli tool (req. for running `cdk deploy ...`)
-        npm i -g aws-cdk@1.116.0
-
         # switch to SageMaker directory for persistance
         cd ~/SageMaker/
 
-        # install sfs (required by the dashboard code)
-        git clone https://github.com/aws-samples/simple-forecast-solution.git
+        # install sfs (required by the dashboard code), only the latest
+        # commit is cloned, the OnStart script pulls any newer commits
+        git clone --depth 1 --branch main \
+            https://github.com/aws-samples/simple-forecast-solution.git
         cd ./simple-forecast-solution ;
-        git checkout main
         pip install -q -e .
 
         # install lambdamap (required by the dashboard code)
-        git clone https://github.com/aws-samples/lambdamap.git
+        git clone --depth 1 https://github.com/aws-samples/lambdamap.git
         cd ./lambdamap/
         pip install -q -e .
 
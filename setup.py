@@ -15,6 +15,7 @@ setuptools.setup(
         "cloudpickle==1.6.0",
         "plotly",
         "awswrangler",
+        "pyarrow",
         "sspipe",
         "humanfriendly",
         "streamlit-aggrid",